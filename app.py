@@ -23,7 +23,7 @@ sys.path.append(str(project_root))
 # Now import our local modules
 from src.schema_manager import SchemaManager
 from src.database.schema_inspector import inspect_database
-from src.langchain_components.qa_chain import generate_dynamic_query, execute_dynamic_query, memory_manager, get_openai_client
+from src.langchain_components.qa_chain import generate_dynamic_query, execute_dynamic_query, memory_manager, get_openai_client, format_sql_for_display
 
 # Load environment variables - only in local development
 if os.path.exists(".env"):
@@ -32,8 +32,19 @@ if os.path.exists(".env"):
 # Feature flags
 SHOW_SCHEMA_EDITOR = True  # Set to False to hide
 
+@st.cache_resource
+def get_schema_manager():
+    """Create the schema manager once per process so its parsed configs survive reruns."""
+    manager = SchemaManager()
+    try:
+        manager.preload_all(["snowflake"])
+    except Exception:
+        # Only a warm-up; load_schema_config reports a broken config when it is needed
+        pass
+    return manager
+
 # Initialize schema manager
-schema_manager = SchemaManager()
+schema_manager = get_schema_manager()
 
 def format_dataframe(df):
     """Apply formatting to DataFrame based on column patterns."""
@@ -239,7 +250,7 @@ def display_chat_history():
             
             # Display SQL query with a toggle button
             if st.button(f"🔍 Toggle Cyl", key=f"sql_toggle_{i}"):
-                st.code(interaction['query'], language="sql")
+                st.code(format_sql_for_display(interaction['query']), language="sql")
             
             # Display result
             st.markdown("**Result:**")
@@ -352,7 +363,7 @@ def main():
                 with st.expander("Cylyndyr", expanded=False):
                     st.markdown(f"**Question:** {question}")
                     st.markdown("**Cyl:**")
-                    st.code(sql_query, language="sql")
+                    st.code(format_sql_for_display(sql_query), language="sql")
                 
                 # Execute query and show results
                 results = execute_dynamic_query(sql_query, question, st.session_state.session_id)
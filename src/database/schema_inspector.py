@@ -3,9 +3,96 @@ import yaml
 from datetime import datetime
 import sys
 import os
-import pandas as pd
-from sqlalchemy import create_engine, text
-from snowflake.sqlalchemy import URL
+from types import MappingProxyType
+
+# Kept local rather than imported from src.yaml_compat: this file also runs as a
+# standalone script, where the src package isn't importable
+try:
+    from yaml import CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeDumper
+
+# Known TPC-H relationships
+_TPCH_RELATIONSHIPS = MappingProxyType({
+    'ORDERS': (
+        {'table': 'CUSTOMER', 'key': 'O_CUSTKEY', 'ref_key': 'C_CUSTKEY'},
+    ),
+    'LINEITEM': (
+        {'table': 'ORDERS', 'key': 'L_ORDERKEY', 'ref_key': 'O_ORDERKEY'},
+        {'table': 'PART', 'key': 'L_PARTKEY', 'ref_key': 'P_PARTKEY'},
+        {'table': 'SUPPLIER', 'key': 'L_SUPPKEY', 'ref_key': 'S_SUPPKEY'},
+    ),
+    'PARTSUPP': (
+        {'table': 'PART', 'key': 'PS_PARTKEY', 'ref_key': 'P_PARTKEY'},
+        {'table': 'SUPPLIER', 'key': 'PS_SUPPKEY', 'ref_key': 'S_SUPPKEY'},
+    ),
+    'SUPPLIER': (
+        {'table': 'NATION', 'key': 'S_NATIONKEY', 'ref_key': 'N_NATIONKEY'},
+    ),
+    'CUSTOMER': (
+        {'table': 'NATION', 'key': 'C_NATIONKEY', 'ref_key': 'N_NATIONKEY'},
+    ),
+    'NATION': (
+        {'table': 'REGION', 'key': 'N_REGIONKEY', 'ref_key': 'R_REGIONKEY'},
+    )
+})
+
+# Known TPC-H primary keys as (table, column) pairs
+_TPCH_PRIMARY_KEYS = frozenset({
+    ('CUSTOMER', 'C_CUSTKEY'),
+    ('LINEITEM', 'L_ORDERKEY'),
+    ('LINEITEM', 'L_LINENUMBER'),
+    ('NATION', 'N_NATIONKEY'),
+    ('ORDERS', 'O_ORDERKEY'),
+    ('PART', 'P_PARTKEY'),
+    ('PARTSUPP', 'PS_PARTKEY'),
+    ('PARTSUPP', 'PS_SUPPKEY'),
+    ('REGION', 'R_REGIONKEY'),
+    ('SUPPLIER', 'S_SUPPKEY')
+})
+
+_TPCH_TABLE_DESC = MappingProxyType({
+    'CUSTOMER': 'Contains customer information including demographics and market segments',
+    'LINEITEM': 'Contains the line items of all orders, representing the sales details of each transaction',
+    'NATION': 'Contains information about nations/countries',
+    'ORDERS': 'Contains all orders made by customers',
+    'PART': 'Contains information about parts/products available for sale',
+    'PARTSUPP': 'Contains supplier information for parts (price and availability)',
+    'REGION': 'Contains information about geographical regions',
+    'SUPPLIER': 'Contains supplier information including contact details and location'
+})
+
+_TPCH_COLUMN_DESCRIPTIONS = {
+    'CUSTOMER': {
+        'C_CUSTKEY': 'Unique identifier for the customer',
+        'C_NAME': 'Customer name',
+        'C_ADDRESS': 'Customer address',
+        'C_NATIONKEY': 'Reference to the nation where the customer is located',
+        'C_PHONE': 'Customer phone number',
+        'C_ACCTBAL': 'Customer account balance',
+        'C_MKTSEGMENT': 'Market segment to which the customer belongs',
+        'C_COMMENT': 'Additional comments about the customer'
+    },
+    'ORDERS': {
+        'O_ORDERKEY': 'Unique identifier for the order',
+        'O_CUSTKEY': 'Reference to the customer who placed the order',
+        'O_ORDERSTATUS': 'Current status of the order',
+        'O_TOTALPRICE': 'Total price of the order',
+        'O_ORDERDATE': 'Date when the order was placed',
+        'O_ORDERPRIORITY': 'Priority level of the order',
+        'O_CLERK': 'Clerk who processed the order',
+        'O_SHIPPRIORITY': 'Shipping priority of the order',
+        'O_COMMENT': 'Additional comments about the order'
+    }
+    # Add more table/column descriptions as needed
+}
+
+# Flattened (table, column) -> description lookup
+_TPCH_COL_DESC = MappingProxyType({
+    (table, column): description
+    for table, columns in _TPCH_COLUMN_DESCRIPTIONS.items()
+    for column, description in columns.items()
+})
 
 def inspect_sqlite_database(db_path):
     """
@@ -93,6 +180,8 @@ def inspect_snowflake_database(engine):
     """
     Inspect a Snowflake database and generate a schema configuration.
     """
+    from sqlalchemy import text
+    
     schema_config = {
         'business_context': {
             'description': 'Auto-generated schema configuration for Snowflake TPC-H sample data',
@@ -124,43 +213,6 @@ def inspect_snowflake_database(engine):
         result = conn.execute(tables_query)
         tables = [row[0] for row in result]
         
-        # Known TPC-H relationships
-        tpch_relationships = {
-            'ORDERS': [
-                {'table': 'CUSTOMER', 'key': 'O_CUSTKEY', 'ref_key': 'C_CUSTKEY'},
-            ],
-            'LINEITEM': [
-                {'table': 'ORDERS', 'key': 'L_ORDERKEY', 'ref_key': 'O_ORDERKEY'},
-                {'table': 'PART', 'key': 'L_PARTKEY', 'ref_key': 'P_PARTKEY'},
-                {'table': 'SUPPLIER', 'key': 'L_SUPPKEY', 'ref_key': 'S_SUPPKEY'},
-            ],
-            'PARTSUPP': [
-                {'table': 'PART', 'key': 'PS_PARTKEY', 'ref_key': 'P_PARTKEY'},
-                {'table': 'SUPPLIER', 'key': 'PS_SUPPKEY', 'ref_key': 'S_SUPPKEY'},
-            ],
-            'SUPPLIER': [
-                {'table': 'NATION', 'key': 'S_NATIONKEY', 'ref_key': 'N_NATIONKEY'},
-            ],
-            'CUSTOMER': [
-                {'table': 'NATION', 'key': 'C_NATIONKEY', 'ref_key': 'N_NATIONKEY'},
-            ],
-            'NATION': [
-                {'table': 'REGION', 'key': 'N_REGIONKEY', 'ref_key': 'R_REGIONKEY'},
-            ]
-        }
-        
-        # Known TPC-H primary keys
-        tpch_primary_keys = {
-            'CUSTOMER': ['C_CUSTKEY'],
-            'LINEITEM': ['L_ORDERKEY', 'L_LINENUMBER'],
-            'NATION': ['N_NATIONKEY'],
-            'ORDERS': ['O_ORDERKEY'],
-            'PART': ['P_PARTKEY'],
-            'PARTSUPP': ['PS_PARTKEY', 'PS_SUPPKEY'],
-            'REGION': ['R_REGIONKEY'],
-            'SUPPLIER': ['S_SUPPKEY']
-        }
-        
         # Inspect each table
         for table_name in tables:
             # Get column info
@@ -194,15 +246,15 @@ def inspect_snowflake_database(engine):
                 }
                 
                 # Add primary key info from TPC-H schema
-                if table_name in tpch_primary_keys and col[0] in tpch_primary_keys[table_name]:
+                if (table_name, col[0]) in _TPCH_PRIMARY_KEYS:
                     field_info['is_key'] = True
                 
                 table_info['fields'][col[0]] = field_info
             
             # Add relationships based on TPC-H schema
-            if table_name in tpch_relationships:
+            if table_name in _TPCH_RELATIONSHIPS:
                 table_info['relationships'] = []
-                for rel in tpch_relationships[table_name]:
+                for rel in _TPCH_RELATIONSHIPS[table_name]:
                     relationship = {
                         'table': rel['table'],
                         'type': 'many_to_one',
@@ -219,50 +271,16 @@ def inspect_snowflake_database(engine):
 
 def get_tpch_table_description(table_name):
     """Get description for TPC-H tables."""
-    descriptions = {
-        'CUSTOMER': 'Contains customer information including demographics and market segments',
-        'LINEITEM': 'Contains the line items of all orders, representing the sales details of each transaction',
-        'NATION': 'Contains information about nations/countries',
-        'ORDERS': 'Contains all orders made by customers',
-        'PART': 'Contains information about parts/products available for sale',
-        'PARTSUPP': 'Contains supplier information for parts (price and availability)',
-        'REGION': 'Contains information about geographical regions',
-        'SUPPLIER': 'Contains supplier information including contact details and location'
-    }
-    return descriptions.get(table_name, f'Table containing {table_name} data')
+    return _TPCH_TABLE_DESC.get(table_name, f'Table containing {table_name} data')
 
 def get_tpch_column_description(table_name, column_name):
     """Get description for TPC-H columns."""
-    descriptions = {
-        'CUSTOMER': {
-            'C_CUSTKEY': 'Unique identifier for the customer',
-            'C_NAME': 'Customer name',
-            'C_ADDRESS': 'Customer address',
-            'C_NATIONKEY': 'Reference to the nation where the customer is located',
-            'C_PHONE': 'Customer phone number',
-            'C_ACCTBAL': 'Customer account balance',
-            'C_MKTSEGMENT': 'Market segment to which the customer belongs',
-            'C_COMMENT': 'Additional comments about the customer'
-        },
-        'ORDERS': {
-            'O_ORDERKEY': 'Unique identifier for the order',
-            'O_CUSTKEY': 'Reference to the customer who placed the order',
-            'O_ORDERSTATUS': 'Current status of the order',
-            'O_TOTALPRICE': 'Total price of the order',
-            'O_ORDERDATE': 'Date when the order was placed',
-            'O_ORDERPRIORITY': 'Priority level of the order',
-            'O_CLERK': 'Clerk who processed the order',
-            'O_SHIPPRIORITY': 'Shipping priority of the order',
-            'O_COMMENT': 'Additional comments about the order'
-        }
-        # Add more table/column descriptions as needed
-    }
-    return descriptions.get(table_name, {}).get(column_name, f'{column_name} field')
+    return _TPCH_COL_DESC.get((table_name, column_name), f'{column_name} field')
 
 def save_schema_config(config, output_path):
     """Save the schema configuration to a YAML file."""
     with open(output_path, 'w') as f:
-        yaml.dump(config, f, sort_keys=False, default_flow_style=False)
+        yaml.dump(config, f, Dumper=SafeDumper, sort_keys=False, default_flow_style=False)
 
 def inspect_database(db_type="sqlite", **connection_params):
     """
@@ -280,6 +298,10 @@ def inspect_database(db_type="sqlite", **connection_params):
         if missing_params:
             raise ValueError(f"Missing required Snowflake connection parameters: {', '.join(missing_params)}")
         
+        # Imported here so the SQLite path never loads the Snowflake stack
+        from sqlalchemy import create_engine
+        from snowflake.sqlalchemy import URL
+        
         engine = create_engine(URL(
             account=connection_params['account'],
             user=connection_params['user'],
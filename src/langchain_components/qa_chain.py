@@ -1,85 +1,183 @@
 from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import HumanMessage
 import pandas as pd
 import yaml
 import re
-from collections import defaultdict
+import hashlib
+from string import Template
+from collections import OrderedDict, defaultdict, deque
 from datetime import datetime
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import asyncio
+import atexit
+import threading
+import time
+import itertools
 import os
-import json
+import orjson
 import snowflake.connector
 from dotenv import load_dotenv
-import sqlparse
+import sqlglot
+from src.yaml_compat import SafeLoader
 
 # Load environment variables
 load_dotenv(override=True)
 
-# Set up logging
-log_dir = "logs"
-if not os.path.exists(log_dir):
-    os.makedirs(log_dir)
+# SQL dialect used to parse and render generated queries
+SQL_DIALECT = "snowflake"
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.join(log_dir, f'chat_history_{datetime.now().strftime("%Y%m%d")}.log')),
-        logging.StreamHandler()
-    ]
-)
+# Chat history goes to this module's logger, so other libraries' records stay out of it
+logger = logging.getLogger(__name__)
+
+def setup_logging(log_dir="logs"):
+    """Attach the chat history handlers to the module logger, at most once per process."""
+    # The logger outlives module reloads (e.g. Streamlit's file watcher); never stack handlers
+    if logger.handlers:
+        return
+    
+    os.makedirs(log_dir, exist_ok=True)
+    log_formatter = logging.Formatter('%(asctime)s - %(message)s')
+    file_handler = logging.FileHandler(os.path.join(log_dir, f'chat_history_{datetime.now().strftime("%Y%m%d")}.log'))
+    file_handler.setFormatter(log_formatter)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(log_formatter)
+    
+    # Request threads only enqueue records; a background listener does the I/O
+    log_queue = queue.Queue(-1)
+    log_listener = QueueListener(log_queue, file_handler, stream_handler)
+    log_listener.start()
+    atexit.register(log_listener.stop)
+    
+    logger.setLevel(logging.INFO)
+    logger.addHandler(QueueHandler(log_queue))
+    # These handlers already cover file and console; root handlers would write every record again
+    logger.propagate = False
+
+setup_logging()
+
+# Shared chat model; reusing it keeps the underlying HTTP connection pool warm
+_llm = None
 
 def get_openai_client():
-    """Initialize OpenAI client with API key."""
+    """Return the shared OpenAI client, initializing it on first use."""
+    global _llm
+    if _llm is not None:
+        return _llm
+    
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise ValueError("OpenAI API key not found in environment variables")
     
-    logging.info(f"API Key found: {bool(api_key)}")
-    logging.info(f"API Key length: {len(api_key)}")
-    logging.info(f"API Key prefix: {api_key[:7]}...")
+    # Key diagnostics are only useful when debugging credential issues
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("API Key found: %s", bool(api_key))
+        logger.debug("API Key length: %d", len(api_key))
+        logger.debug("API Key prefix: %s...", api_key[:7])
     
-    return ChatOpenAI(
+    _llm = ChatOpenAI(
         api_key=api_key,
         model="gpt-3.5-turbo",
-        temperature=0
+        temperature=0,
+        streaming=True
     )
+    return _llm
+
+# Shared Snowflake connection; callers open their own cursors on it
+_snowflake_conn = None
+_snowflake_lock = threading.Lock()
 
 def get_snowflake_connection():
-    """Create and return a Snowflake connection."""
-    return snowflake.connector.connect(
-        account=os.getenv('SNOWFLAKE_ACCOUNT'),
-        user=os.getenv('SNOWFLAKE_USER'),
-        password=os.getenv('SNOWFLAKE_PASSWORD'),
-        database=os.getenv('SNOWFLAKE_DATABASE'),
-        warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
-        schema=os.getenv('SNOWFLAKE_SCHEMA')
-    )
+    """Return the shared Snowflake connection, reconnecting if it was closed."""
+    global _snowflake_conn
+    with _snowflake_lock:
+        if _snowflake_conn is None or _snowflake_conn.is_closed():
+            _snowflake_conn = snowflake.connector.connect(
+                account=os.getenv('SNOWFLAKE_ACCOUNT'),
+                user=os.getenv('SNOWFLAKE_USER'),
+                password=os.getenv('SNOWFLAKE_PASSWORD'),
+                database=os.getenv('SNOWFLAKE_DATABASE'),
+                warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
+                schema=os.getenv('SNOWFLAKE_SCHEMA'),
+                # Heartbeats keep the long-lived session from expiring while idle
+                client_session_keep_alive=True
+            )
+        return _snowflake_conn
+
+def close_snowflake_connection():
+    """Close the shared Snowflake connection, if one is open."""
+    global _snowflake_conn
+    with _snowflake_lock:
+        if _snowflake_conn is not None:
+            _snowflake_conn.close()
+            _snowflake_conn = None
+
+atexit.register(close_snowflake_connection)
+
+# Thread ids that can be used as spill file names as they are
+_SAFE_THREAD_ID_RE = re.compile(r'[A-Za-z0-9_-]+')
 
 class QueryMemoryManager:
     """Manages query history and interactions."""
     
-    def __init__(self, window_size=7):
-        self.history = defaultdict(list)
+    # Longest formatted result (preview or error message) kept per interaction
+    max_result_chars = 2048
+    
+    def __init__(self, window_size=7, spill_dir=None):
+        # Per-thread history grows to twice the window before being cut back, so
+        # most turns only append and the prompt's history prefix stays stable
+        self.history = defaultdict(lambda: deque(maxlen=2 * window_size))
         self.window_size = window_size
+        # Entries cut from the window are appended to {spill_dir}/{thread_id}.jsonl when set
+        self.spill_dir = spill_dir
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
     
     def get_chat_history(self, thread_id: str = "default"):
-        return self.history[thread_id][-self.window_size:] if self.history[thread_id] else []
+        return list(self.history[thread_id])
     
     def format_result(self, result):
         """Format result for storage, with special handling for DataFrames."""
         if isinstance(result, pd.DataFrame):
             if result.empty:
                 return "Empty DataFrame"
-            # Format DataFrame with clean spacing and alignment
-            return result.to_string(
+            # Slice before formatting so the cost doesn't grow with the result size;
+            # wide frames can still render long rows, so the text is capped too
+            return result.head(10).to_string(
                 index=False,
-                max_rows=10,  # Limit rows for readability
-                max_cols=None,
                 line_width=80,
                 justify='left'
-            )
-        return str(result)
+            )[:self.max_result_chars]
+        return str(result)[:self.max_result_chars]
+    
+    def summarize_result(self, result):
+        """Summarize a DataFrame result as its shape, columns and first few rows."""
+        if not isinstance(result, pd.DataFrame):
+            return None
+        return {
+            'shape': list(result.shape),
+            'columns': [str(c) for c in result.columns],
+            'sample': result.head(3).to_dict('records')
+        }
+    
+    def compact_result(self, result):
+        """Describe a result in one line (shape, columns, first row) for older history entries."""
+        if isinstance(result, pd.DataFrame):
+            if result.empty:
+                return "Empty DataFrame"
+            first_row = ", ".join(f"{col}={value}" for col, value in result.iloc[0].items())
+            columns = ", ".join(str(col) for col in result.columns)
+            summary = f"{len(result)} rows × {len(result.columns)} cols: [{columns}]; first row: {first_row}"
+            return summary[:self.max_result_chars]
+        return str(result)[:self.max_result_chars]
+    
+    def render_interaction(self, question: str, query: str, formatted_result: str):
+        """Render an interaction as prompt history, flagging empty results for adjustment."""
+        entry = f"Q: {question}\nSQL: {query}"
+        if "Empty DataFrame" in formatted_result:
+            return entry + "\nResult: EMPTY RESULT - Query needs adjustment"
+        return entry + f"\nResult: {formatted_result}"
     
     def save_interaction(self, thread_id: str, question: str, query: str, result):
         """Save interaction with improved result formatting."""
@@ -88,56 +186,268 @@ class QueryMemoryManager:
             'thread_id': thread_id,
             'question': question,
             'query': query,
-            'result': self.format_result(result)
+            'result': self.format_result(result),
+            'summary': self.summarize_result(result)
         }
-        self.history[thread_id].append(interaction)
-        logging.info(json.dumps(interaction, indent=2))
+        # Sample rows may hold Decimal/Timestamp values; fall back to str for those
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("%s", orjson.dumps(interaction, default=str, option=orjson.OPT_NON_STR_KEYS).decode())
+        
+        # Rendered once here so prompt building only has to join the snippets; only the
+        # latest entry keeps the full preview, older ones are sent in compact form
+        interaction['_rendered'] = self.render_interaction(question, query, interaction['result'])
+        interaction['_rendered_compact'] = self.render_interaction(question, query, self.compact_result(result))
+        history = self.history[thread_id]
+        history.append(interaction)
+        if len(history) >= 2 * self.window_size:
+            dropped = [history.popleft() for _ in range(len(history) - self.window_size)]
+            if self.spill_dir:
+                self.spill_interactions(thread_id, dropped)
+    
+    def spill_path(self, thread_id: str):
+        """Return the thread's spill file, hashing ids that aren't plain names so it stays in spill_dir."""
+        name = str(thread_id)
+        if not _SAFE_THREAD_ID_RE.fullmatch(name):
+            name = hashlib.sha256(name.encode()).hexdigest()
+        return os.path.join(self.spill_dir, f"{name}.jsonl")
+    
+    def spill_interactions(self, thread_id: str, interactions):
+        """Append interactions dropped from the window to the thread's JSONL file."""
+        lines = b"".join(
+            orjson.dumps(
+                {k: v for k, v in interaction.items() if not k.startswith('_')},
+                default=str,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+            )
+            for interaction in interactions
+        )
+        try:
+            with open(self.spill_path(thread_id), 'ab') as f:
+                f.write(lines)
+        except OSError as e:
+            # Spilled entries are an archive only; losing them must not fail the query
+            logger.error("Error spilling chat history: %s", e)
+
+# Parsed prompt config, reused until prompts.yaml changes on disk
+_prompt_config_cache = {}
 
 def load_prompt_config():
-    """Load prompt configuration from YAML."""
+    """Load prompt configuration from YAML, reusing the parsed file while it is unchanged."""
     try:
+        mtime = os.stat('prompts.yaml').st_mtime_ns
+        cached = _prompt_config_cache.get('prompts.yaml')
+        if cached and cached[0] == mtime:
+            return cached[1]
+        
         with open('prompts.yaml', 'r') as file:
-            config = yaml.safe_load(file)
-            return config['prompts']['sql_generation']
+            config = yaml.load(file, Loader=SafeLoader)
+        prompt_config = config['prompts']['sql_generation']
+        _prompt_config_cache['prompts.yaml'] = (mtime, prompt_config)
+        return prompt_config
     except Exception as e:
-        logging.error(f"Error loading prompt config: {str(e)}")
+        logger.error("Error loading prompt config: %s", e)
         raise
 
-def format_schema_context(config):
-    """Convert schema config into prompt-friendly format."""
+def get_prompt_config_version():
+    """Return the mtime of prompts.yaml, or None if it doesn't exist."""
+    try:
+        return os.stat('prompts.yaml').st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+# Latest config object seen per db_type, with the version number handed out for it
+_config_versions = {}
+_config_version_counter = itertools.count(1)
+
+def get_config_version(config):
+    """Identify a schema config by its db_type and a version number unique to that config object.
+
+    SchemaManager.load_config returns the same dict until the file changes, so a
+    saved edit, or any other config passed in, gets a new number. Numbers are never
+    reused, so a stale cache entry can't match.
+    """
+    db_type = config.get('database_config', {}).get('type')
+    cached = _config_versions.get(db_type)
+    if cached and cached[0] is config:
+        return db_type, cached[1]
+    
+    version = next(_config_version_counter)
+    _config_versions[db_type] = (config, version)
+    return db_type, version
+
+# Formatted prompt sections keyed by db_type, reused while the same config is passed in
+_schema_context_cache = {}
+_example_queries_cache = {}
+
+def get_cached_section(cache, config, formatter):
+    """Return formatter(config), reusing the last result built from this version of the config."""
+    db_type, version = get_config_version(config)
+    cached = cache.get(db_type)
+    if cached and cached[0] == version:
+        return cached[1]
+    
+    section = formatter(config)
+    cache[db_type] = (version, section)
+    return section
+
+# Best-scoring tables whose full field list goes into a prompt; ties at the cutoff and
+# tables needed to join them are added on top. The summary still names every column
+MAX_DETAILED_TABLES = 3
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+_STOP_WORDS = frozenset({
+    'all', 'and', 'are', 'each', 'field', 'for', 'from', 'have', 'how', 'including',
+    'many', 'much', 'our', 'per', 'show', 'table', 'the', 'what', 'where', 'which', 'with'
+})
+_table_index_cache = {}
+_table_details_cache = {}
+_join_graph_cache = {}
+
+def tokenize(text):
+    """Split text into lowercase keyword tokens, folding simple plurals."""
+    tokens = set()
+    for word in _WORD_RE.findall(text.lower()):
+        if len(word) < 3 or word in _STOP_WORDS:
+            continue
+        tokens.add(word[:-1] if len(word) > 3 and word.endswith('s') else word)
+    return tokens
+
+def build_table_index(config):
+    """Map each table to its name tokens and the keyword tokens of its description and fields."""
+    index = {}
+    for table_name, table_info in config['tables'].items():
+        words = [table_name, table_info.get('description', '')]
+        for field_name, field_info in table_info['fields'].items():
+            words.append(field_name)
+            words.append(field_info.get('description', ''))
+        index[table_name] = (tokenize(table_name), tokenize(" ".join(words)))
+    return index
+
+def build_join_graph(config):
+    """Map each table to the tables it is linked to by a foreign key or relationship."""
+    graph = {table_name: set() for table_name in config['tables']}
+    for table_name, table_info in config['tables'].items():
+        targets = [rel['table'] for rel in table_info.get('relationships', [])]
+        targets.extend(
+            field_info['foreign_key'].split('.')[0]
+            for field_info in table_info['fields'].values() if field_info.get('foreign_key')
+        )
+        for target in targets:
+            if target in graph and target != table_name:
+                graph[table_name].add(target)
+                graph[target].add(table_name)
+    return graph
+
+def find_join_path(graph, start, end):
+    """Return the tables on a shortest join path from start to end, or [] if they aren't linked."""
+    parents = {start: None}
+    frontier = deque([start])
+    while frontier:
+        table_name = frontier.popleft()
+        if table_name == end:
+            path = []
+            while table_name is not None:
+                path.append(table_name)
+                table_name = parents[table_name]
+            return path
+        for neighbour in sorted(graph[table_name]):
+            if neighbour not in parents:
+                parents[neighbour] = table_name
+                frontier.append(neighbour)
+    return []
+
+def select_relevant_tables(config, question, max_tables=MAX_DETAILED_TABLES):
+    """Pick the tables a question most likely touches by keyword overlap.
+
+    Table-name matches weigh more than description matches. The best max_tables
+    are kept, along with any table tied with the last of them and the tables on
+    the join paths between them. Falls back to every table when nothing in the
+    question matches the schema.
+    """
+    index = get_cached_section(_table_index_cache, config, build_table_index)
+    question_tokens = tokenize(question or "")
+    
+    scores = {}
+    for table_name, (name_tokens, tokens) in index.items():
+        score = len(question_tokens & tokens) + 2 * len(question_tokens & name_tokens)
+        if score:
+            scores[table_name] = score
+    if not scores:
+        return sorted(index)
+    
+    ranked = sorted(scores, key=lambda t: (-scores[t], t))
+    cutoff = scores[ranked[min(max_tables, len(ranked)) - 1]]
+    selected = {t for t in ranked if scores[t] >= cutoff}
+    
+    # Detail blocks alone don't help if the tables linking them are missing
+    graph = get_cached_section(_join_graph_cache, config, build_join_graph)
+    for table_name in list(selected):
+        selected.update(find_join_path(graph, ranked[0], table_name))
+    return sorted(selected)
+
+def format_schema_summary(config):
+    """Convert schema config into a compact prompt summary of every table."""
     if not config:
         return ""
         
-    context = [f"Business Context: {config['business_context']['description']}"]
+    # Lines are collected once and joined at the end; "" marks a blank line
+    out = [f"Business Context: {config['business_context']['description']}", "", "Key Business Concepts:"]
+    out.extend(f"- {c}" for c in config['business_context']['key_concepts'])
     
-    concepts = "\n".join(f"- {c}" for c in config['business_context']['key_concepts'])
-    context.append(f"Key Business Concepts:\n{concepts}")
+    # Tables and columns are sorted so the prompt is byte-identical regardless of YAML ordering
+    out.extend(["", "Tables:"])
+    for table_name, table_info in sorted(config['tables'].items()):
+        columns = ", ".join(sorted(table_info['fields']))
+        out.append(f"- {table_name}: {table_info['description']} (Columns: {columns})")
     
-    for table_name, table_info in config['tables'].items():
-        context.append(f"\nTable: {table_name}")
-        context.append(f"Description: {table_info['description']}")
-        
-        fields = []
-        for field_name, field_info in table_info['fields'].items():
-            field_desc = f"- {field_name} ({field_info['type']}): {field_info['description']}"
-            if field_info.get('is_key'):
-                field_desc += " (Primary Key)"
+    # Join keys for every table, so tables without a detail block can still be joined
+    joins = []
+    for table_name, table_info in sorted(config['tables'].items()):
+        rel_types = {rel['table']: rel['type'] for rel in table_info.get('relationships', [])}
+        for field_name, field_info in sorted(table_info['fields'].items()):
             if field_info.get('foreign_key'):
-                field_desc += f" (Foreign Key -> {field_info['foreign_key']})"
-            fields.append(field_desc)
-        context.append("Fields:\n" + "\n".join(fields))
-        
-        if 'relationships' in table_info:
-            rels = []
-            for rel in table_info['relationships']:
-                rels.append(f"- {rel['type']} relationship with {rel['table']} on {rel['join_fields']}")
-            context.append("Relationships:\n" + "\n".join(rels))
+                target = field_info['foreign_key']
+                rel_type = rel_types.get(target.split('.')[0])
+                joins.append(f"- {table_name}.{field_name} -> {target}" + (f" ({rel_type})" if rel_type else ""))
+    if joins:
+        out.extend(["", "Joins:"])
+        out.extend(joins)
     
     if config.get('query_guidelines'):
-        tips = "\n".join(f"- {tip}" for tip in config['query_guidelines']['tips'])
-        context.append(f"\nQuery Guidelines:\n{tips}")
+        out.extend(["", "", "Query Guidelines:"])
+        out.extend(f"- {tip}" for tip in config['query_guidelines']['tips'])
+    
+    return "\n".join(out)
+
+def format_table_detail(config, table_name):
+    """Format the full field and relationship listing for one table."""
+    table_info = config['tables'][table_name]
+    out = [f"Table: {table_name}", "", f"Description: {table_info['description']}", "", "Fields:"]
     
-    return "\n\n".join(context)
+    for field_name, field_info in sorted(table_info['fields'].items()):
+        field_desc = f"- {field_name} ({field_info['type']}): {field_info['description']}"
+        if field_info.get('is_key'):
+            field_desc += " (Primary Key)"
+        if field_info.get('foreign_key'):
+            field_desc += f" (Foreign Key -> {field_info['foreign_key']})"
+        out.append(field_desc)
+    
+    if 'relationships' in table_info:
+        out.extend(["", "Relationships:"])
+        for rel in table_info['relationships']:
+            out.append(f"- {rel['type']} relationship with {rel['table']} on {rel['join_fields']}")
+    
+    return "\n".join(out)
+
+def format_all_table_details(config):
+    """Format the detail block of every table, keyed by table name."""
+    return {table_name: format_table_detail(config, table_name) for table_name in config['tables']}
+
+def format_table_details(config, question):
+    """Format detail blocks for the tables relevant to the question."""
+    details = get_cached_section(_table_details_cache, config, format_all_table_details)
+    blocks = [details[table_name] for table_name in select_relevant_tables(config, question)]
+    return "Relevant Table Details:\n\n" + "\n\n\n".join(blocks)
 
 def format_example_queries(config):
     """Format example queries from the configuration."""
@@ -148,36 +458,53 @@ def format_example_queries(config):
     if not db_config or 'example_queries' not in db_config:
         return ""
 
-    examples = ["\nExample Queries:"]
+    out = ["", "Example Queries:"]
     for example in db_config['example_queries']:
-        examples.append(f"\n{example['description']}:")
-        examples.append(example['query'].strip())
+        out.extend(["", f"{example['description']}:", example['query'].strip()])
     
-    return "\n".join(examples)
+    return "\n".join(out)
+
+# Markdown code fences the model sometimes wraps its SQL in
+_SQL_FENCE_RE = re.compile(r'```sql|```')
 
 def sanitize_sql(query):
-    """Sanitize SQL query using sqlparse for better reliability."""
+    """Strip Markdown fences from an SQL query and validate it with sqlglot."""
     # Remove SQL code blocks if present
-    query = re.sub(r'```sql|```', '', query)
-    
-    # Format the SQL properly using sqlparse
-    formatted = sqlparse.format(
-        query,
-        reindent=True,
-        keyword_case='upper',
-        identifier_case='upper',  # Snowflake uses uppercase
-        strip_comments=True,
-        use_space_around_operators=True
-    )
+    query = _SQL_FENCE_RE.sub('', query).strip()
+    
+    # Parse with the Snowflake dialect; malformed SQL raises ParseError here
+    # instead of costing a round-trip to the warehouse
+    sqlglot.parse_one(query, read=SQL_DIALECT)
     
-    return formatted.strip()
+    return query
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def sql_fingerprint(query):
+    """Collapse whitespace so queries differing only in layout compare equal."""
+    # Case is kept: string literals in Snowflake comparisons are case-sensitive
+    return _WHITESPACE_RE.sub(' ', query.strip())
+
+def format_sql_for_display(query):
+    """Pretty-print an SQL query for display, leaving it unchanged if it does not parse."""
+    try:
+        statements = sqlglot.transpile(query, read=SQL_DIALECT, write=SQL_DIALECT, pretty=True)
+    except sqlglot.errors.SqlglotError:
+        return query
+    return ";\n".join(statements) if statements else query
+
+# How long a fetched ORDERS date range is reused before Snowflake is asked again
+TIMEFRAME_TTL_SECONDS = 3600
+_timeframe_cache = {'value': None, 'expires': 0.0}
 
 def get_data_timeframe():
-    """Get the actual timeframe of data in the ORDERS table."""
-    conn = None
+    """Get the actual timeframe of data in the ORDERS table, cached for TIMEFRAME_TTL_SECONDS."""
+    if time.monotonic() < _timeframe_cache['expires']:
+        return _timeframe_cache['value']
+    
+    cursor = None
     try:
-        conn = get_snowflake_connection()
-        cursor = conn.cursor()
+        cursor = get_snowflake_connection().cursor()
         cursor.execute("""
             SELECT 
                 MIN(O_ORDERDATE) as min_date,
@@ -185,77 +512,93 @@ def get_data_timeframe():
             FROM ORDERS
         """)
         min_date, max_date = cursor.fetchone()
+        # Failures below are not cached, so the next question retries
+        _timeframe_cache['value'] = (min_date, max_date)
+        _timeframe_cache['expires'] = time.monotonic() + TIMEFRAME_TTL_SECONDS
         return min_date, max_date
     except Exception as e:
-        logging.error(f"Error getting data timeframe: {str(e)}")
+        logger.error("Error getting data timeframe: %s", e)
         return None, None
     finally:
-        if conn:
-            conn.close()
+        if cursor:
+            cursor.close()
 
-def create_sql_generation_prompt(chat_history=None, config=None):
-    """Create prompt template using configuration from YAML."""
-    if not config:
-        # Basic template without any schema context or helpful rules
-        prompt_text = """
+# Basic template without any schema context or helpful rules
+BASIC_PROMPT = Template("""
         Generate a SQL query to answer this question. The database contains tables about customers, orders, and products.
         
-        Question: {question}
+        Question: $question
         
         Return only the SQL query without any explanation.
-        """
-        return ChatPromptTemplate.from_template(prompt_text)
-    
-    # Full featured template with all context and rules
-    prompt_config = load_prompt_config()
-    min_date, max_date = get_data_timeframe()
-    
-    if 'query_rules' not in prompt_config:
-        prompt_config['query_rules'] = []
-    
-    prompt_config['query_rules'].extend([
+        """)
+
+# Compiled template and static section values per db_type, stored with the inputs they came from
+_static_prompt_cache = {}
+
+def build_static_prompt(config, prompt_config):
+    """Compile the prompt template and render the sections that don't change per question."""
+    # Copy the configured rules; prompt_config is shared through the cache
+    query_rules = list(prompt_config.get('query_rules', []))
+    query_rules.extend([
         "Use UPPERCASE for table and column names",
         "Table names in TPC-H are: CUSTOMER, ORDERS, LINEITEM, PART, PARTSUPP, SUPPLIER, NATION, REGION",
         "Always use the exact column names from the schema (e.g., C_CUSTKEY, O_ORDERKEY)",
         "Use Snowflake date functions (e.g., DATE_TRUNC, DATE_PART) for date operations",
-        f"Data timeframe: Orders from {min_date} to {max_date}",
         "If a query returns empty results, try to determine why and adjust the query accordingly"
     ])
+    formatted_rules = "\n".join(f"{i+1}. {rule}" for i, rule in enumerate(query_rules))
     
-    # Format contexts
-    formatted_rules = "\n".join(f"{i+1}. {rule}" for i, rule in enumerate(prompt_config['query_rules']))
-    schema_context = format_schema_context(config)
-    example_queries = format_example_queries(config)
+    static_values = {
+        'base_role': Template(prompt_config['base_role']).safe_substitute(database_type="Snowflake"),
+        'main_instruction': prompt_config['main_instruction'],
+        'schema_context': get_cached_section(_schema_context_cache, config, format_schema_summary),
+        'example_queries': get_cached_section(_example_queries_cache, config, format_example_queries),
+        'formatted_rules': formatted_rules
+    }
+    return Template(prompt_config['template']), static_values
+
+def get_static_prompt(config):
+    """Return the compiled template and static values, rebuilding them only when an input changed."""
+    prompt_config = load_prompt_config()
+    db_type, version = get_config_version(config)
+    cached = _static_prompt_cache.get(db_type)
+    if cached and cached[0] == version and cached[1] is prompt_config:
+        return cached[2]
+    
+    static_prompt = build_static_prompt(config, prompt_config)
+    _static_prompt_cache[db_type] = (version, prompt_config, static_prompt)
+    return static_prompt
+
+def create_sql_generation_prompt(chat_history=None, config=None, question=None):
+    """Create the SQL generation prompt text using configuration from YAML."""
+    if not config:
+        return BASIC_PROMPT.safe_substitute(question=question)
     
     # Format history context with emphasis on empty results
     history_context = ""
     if chat_history:
-        history_entries = []
-        for h in chat_history:
-            entry = f"Q: {h['question']}\nSQL: {h['query']}"
-            if "Empty DataFrame" in h['result']:
-                entry += "\nResult: EMPTY RESULT - Query needs adjustment"
-            else:
-                entry += f"\nResult: {h['result']}"
-            history_entries.append(entry)
-        history_context = f"\nRecent Query History:\n" + "\n\n".join(history_entries) + "\n"
-    
-    # Full template with schema context
-    prompt_text = prompt_config['template'].format(
-        base_role=prompt_config['base_role'].format(database_type="Snowflake"),
-        main_instruction=prompt_config['main_instruction'],
-        schema_context=schema_context,
-        example_queries=example_queries,
+        *older, latest = chat_history
+        history_entries = "\n\n".join([h['_rendered_compact'] for h in older] + [latest['_rendered']])
+        history_context = f"\nRecent Query History:\n{history_entries}\n"
+    
+    # The timeframe sits after the static prefix so refreshing it keeps that prefix byte-identical
+    min_date, max_date = get_data_timeframe()
+    
+    # One pass over the short template; substituted text is never re-scanned, so
+    # braces or dollar signs in the schema or history need no escaping. safe_substitute
+    # also leaves literal dollar signs in prompts.yaml (e.g. "$5") as they are
+    template, static_values = get_static_prompt(config)
+    return template.safe_substitute(
+        static_values,
+        table_details=format_table_details(config, question),
+        data_timeframe=f"Data timeframe: Orders from {min_date} to {max_date}",
         history_context=history_context,
-        formatted_rules=formatted_rules,
-        question="{question}"  # Left for ChatPromptTemplate to fill
+        question=question
     )
-    
-    return ChatPromptTemplate.from_template(prompt_text)
 
-def refine_query_if_empty(question: str, original_query: str, thread_id: str = "default"):
-    """Generate a refined query if the original returns empty results."""
-    refinement_prompt = f"""
+def build_refinement_prompt(question: str, original_query: str):
+    """Build the prompt asking the model to rework a query that returned no rows."""
+    return f"""
     The following query returned no results:
     {original_query}
     
@@ -268,49 +611,183 @@ def refine_query_if_empty(question: str, original_query: str, thread_id: str = "
     
     Generate only the SQL query, no explanation needed.
     """
-    
+
+def refine_query_if_empty(question: str, original_query: str, thread_id: str = "default"):
+    """Generate a refined query if the original returns empty results."""
     llm = get_openai_client()
-    response = llm.invoke([{"role": "user", "content": refinement_prompt}])
+    response = llm.invoke([{"role": "user", "content": build_refinement_prompt(question, original_query)}])
+    return sanitize_sql(response.content)
+
+async def refine_query_if_empty_async(question: str, original_query: str, thread_id: str = "default"):
+    """Generate a refined query without blocking the event loop."""
+    response = await get_openai_client().ainvoke(
+        [{"role": "user", "content": build_refinement_prompt(question, original_query)}]
+    )
     return sanitize_sql(response.content)
 
+class GeneratedQueryCache:
+    """LRU cache of generated SQL, keyed by everything that shapes the prompt."""
+    
+    def __init__(self, max_size=128):
+        self.entries = OrderedDict()
+        self.max_size = max_size
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(question: str, chat_history, config=None):
+        """Build the cache key from everything that shapes the prompt."""
+        history_key = tuple((h['question'], h['query']) for h in chat_history)
+        if not config:
+            return (None, None, None, question, history_key)
+        
+        # A different or edited schema config, or an edited prompts.yaml, misses the cache
+        db_type, config_version = get_config_version(config)
+        return (db_type, config_version, get_prompt_config_version(), question, history_key)
+    
+    def get(self, key):
+        with self.lock:
+            query = self.entries.get(key)
+            if query is not None:
+                self.entries.move_to_end(key)
+            return query
+    
+    def put(self, key, query: str):
+        with self.lock:
+            self.entries[key] = query
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
 memory_manager = QueryMemoryManager()
+query_cache = GeneratedQueryCache()
+
+def build_generation_messages(question: str, chat_history, config=None):
+    """Build the chat messages sent to the model for one question."""
+    return [HumanMessage(content=create_sql_generation_prompt(chat_history, config, question))]
 
 def generate_dynamic_query(question: str, thread_id: str = "default", config=None):
     """Generate SQL query from natural language question."""
     try:
+        chat_history = memory_manager.get_chat_history(thread_id)
+        cache_key = query_cache.make_key(question, chat_history, config)
+        cached_query = query_cache.get(cache_key)
+        if cached_query is not None:
+            return cached_query
+        
         llm = get_openai_client()
+        messages = build_generation_messages(question, chat_history, config)
+        # Stream the completion so tokens are consumed as soon as they arrive
+        chunks = []
+        for chunk in llm.stream(messages):
+            chunks.append(chunk.content)
+        query = sanitize_sql("".join(chunks))
+        query_cache.put(cache_key, query)
+        return query
+    except Exception as e:
+        logger.error("Error generating query: %s", e)
+        raise
+
+async def generate_dynamic_query_async(question: str, thread_id: str = "default", config=None):
+    """Generate SQL query from natural language question without blocking the event loop."""
+    try:
         chat_history = memory_manager.get_chat_history(thread_id)
-        prompt = create_sql_generation_prompt(chat_history, config)
+        cache_key = query_cache.make_key(question, chat_history, config)
+        cached_query = query_cache.get(cache_key)
+        if cached_query is not None:
+            return cached_query
         
-        messages = prompt.format_messages(question=question)
-        response = llm.invoke(messages)
-        return sanitize_sql(response.content)
+        # Prompt building may query Snowflake for the data timeframe
+        messages = await asyncio.to_thread(build_generation_messages, question, chat_history, config)
+        response = await get_openai_client().ainvoke(messages)
+        query = sanitize_sql(response.content)
+        query_cache.put(cache_key, query)
+        return query
     except Exception as e:
-        logging.error(f"Error generating query: {str(e)}")
+        logger.error("Error generating query: %s", e)
         raise
 
-def execute_dynamic_query(query: str, question: str = None, thread_id: str = "default"):
-    """Execute generated SQL query and return results."""
-    conn = None
+async def generate_dynamic_query_batch(questions, thread_id: str = "default", config=None):
+    """Generate SQL for several questions at once, overlapping the model round-trips.
+
+    All questions see the same thread history; results are returned in input order.
+    """
     try:
-        # Create a new connection for each query
-        conn = get_snowflake_connection()
+        chat_history = memory_manager.get_chat_history(thread_id)
+        cache_keys = [query_cache.make_key(q, chat_history, config) for q in questions]
+        queries = [query_cache.get(key) for key in cache_keys]
+        pending = [i for i, query in enumerate(queries) if query is None]
+        if not pending:
+            return queries
         
-        # Execute query and fetch results into pandas DataFrame
-        cursor = conn.cursor()
+        message_lists = await asyncio.to_thread(
+            lambda: [build_generation_messages(questions[i], chat_history, config) for i in pending]
+        )
+        responses = await get_openai_client().abatch(message_lists)
+        for i, response in zip(pending, responses):
+            queries[i] = sanitize_sql(response.content)
+            query_cache.put(cache_keys[i], queries[i])
+        return queries
+    except Exception as e:
+        logger.error("Error generating queries: %s", e)
+        raise
+
+def fetch_dataframe(cursor):
+    """Fetch the cursor's result set as a DataFrame, preferring the connector's Arrow path."""
+    try:
+        return cursor.fetch_pandas_all()
+    except (AttributeError,
+            snowflake.connector.errors.NotSupportedError,
+            snowflake.connector.errors.ProgrammingError):
+        # No pandas/pyarrow extras, or a result set that isn't Arrow-backed
+        columns = pd.Index([col[0] for col in cursor.description])
+        return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+def run_query(query: str):
+    """Run one query on the shared connection and return its result as a DataFrame."""
+    cursor = get_snowflake_connection().cursor()
+    try:
         cursor.execute(query)
-        columns = [desc[0] for desc in cursor.description]
-        data = cursor.fetchall()
-        df = pd.DataFrame(data, columns=columns)
+        return fetch_dataframe(cursor)
+    finally:
+        cursor.close()
+
+def execute_dynamic_query(query: str, question: str = None, thread_id: str = "default"):
+    """Execute generated SQL query and return results."""
+    try:
+        df = run_query(query)
         
         # If results are empty, try to refine the query
         if df.empty and question:
             refined_query = refine_query_if_empty(question, query, thread_id)
-            if refined_query != query:  # Only if we got a different query
-                cursor.execute(refined_query)
-                columns = [desc[0] for desc in cursor.description]
-                data = cursor.fetchall()
-                df = pd.DataFrame(data, columns=columns)
+            if sql_fingerprint(refined_query) != sql_fingerprint(query):  # Only if we got a different query
+                df = run_query(refined_query)
+                query = refined_query  # Update query to the refined version
+        
+        if question:
+            memory_manager.save_interaction(thread_id, question, query, df)
+        return df
+    except Exception as e:
+        error_msg = f"Error executing query: {str(e)}"
+        if question:
+            memory_manager.save_interaction(thread_id, question, query, error_msg)
+        return error_msg
+
+async def execute_dynamic_query_async(query: str, question: str = None, thread_id: str = "default"):
+    """Execute generated SQL query without blocking the event loop.
+
+    The refinement request is started alongside the first execution and cancelled
+    if that returns rows, so an empty result doesn't wait on a second model call.
+    """
+    refinement = None
+    if question:
+        refinement = asyncio.create_task(refine_query_if_empty_async(question, query, thread_id))
+    try:
+        df = await asyncio.to_thread(run_query, query)
+        
+        if df.empty and refinement:
+            refined_query = await refinement
+            if sql_fingerprint(refined_query) != sql_fingerprint(query):  # Only if we got a different query
+                df = await asyncio.to_thread(run_query, refined_query)
                 query = refined_query  # Update query to the refined version
         
         if question:
@@ -322,5 +799,8 @@ def execute_dynamic_query(query: str, question: str = None, thread_id: str = "de
             memory_manager.save_interaction(thread_id, question, query, error_msg)
         return error_msg
     finally:
-        if conn:
-            conn.close()
+        if refinement:
+            # Unused refinements are dropped; mark a failed one as seen so asyncio doesn't warn
+            refinement.cancel()
+            if refinement.done() and not refinement.cancelled():
+                refinement.exception()
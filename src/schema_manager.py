@@ -1,6 +1,12 @@
+import copy
 import os
+import pickle
+import threading
 import yaml
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from src.yaml_compat import SafeLoader, SafeDumper
 
 class SchemaManager:
     """Manages database schema configurations and user customizations."""
@@ -8,50 +14,155 @@ class SchemaManager:
     def __init__(self, config_dir: str = "schema_configs"):
         """Initialize schema manager with config directory."""
         self.config_dir = config_dir
-        if not os.path.exists(config_dir):
-            os.makedirs(config_dir)
+        # Parsed configs keyed by db_type, stored with the file mtime they came from
+        self._config_cache: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        # Open batch_update blocks are tracked per thread, since one manager can
+        # serve several Streamlit sessions at once
+        self._local = threading.local()
+        os.makedirs(config_dir, exist_ok=True)
 
     def get_config_path(self, db_type: str) -> str:
         """Get path to schema config file for given database type."""
         return os.path.join(self.config_dir, f"{db_type}_schema_config.yaml")
 
     def load_config(self, db_type: str) -> Optional[Dict[str, Any]]:
-        """Load existing schema configuration if it exists."""
+        """Load existing schema configuration if it exists.
+
+        The parsed config is cached and only re-read when the file's mtime changes.
+        A pickled copy next to the YAML skips YAML parsing on cold starts.
+        """
         config_path = self.get_config_path(db_type)
-        if os.path.exists(config_path):
+        try:
+            mtime = os.stat(config_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        
+        cached = self._config_cache.get(db_type)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        
+        config = self._load_pickled_config(config_path, mtime)
+        if config is None:
             with open(config_path, 'r') as f:
-                return yaml.safe_load(f)
-        return None
+                config = yaml.load(f, Loader=SafeLoader)
+            self._save_pickled_config(config_path, mtime, config)
+        self._config_cache[db_type] = (mtime, config)
+        return config
+
+    def preload_all(self, db_types: List[str]) -> None:
+        """Load several configs concurrently so later load_config calls hit the cache."""
+        if not db_types:
+            return
+        # libyaml releases the GIL while parsing, so the files load in parallel
+        with ThreadPoolExecutor(max_workers=min(8, len(db_types))) as executor:
+            list(executor.map(self.load_config, db_types))
+
+    def _load_pickled_config(self, config_path: str, mtime: int) -> Optional[Dict[str, Any]]:
+        """Load the pickled copy of a config if it was built from the current YAML."""
+        pickle_path = config_path + '.pkl'
+        try:
+            with open(pickle_path, 'rb') as f:
+                pickled_mtime, config = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # A corrupt or incompatible sidecar is only a cache; drop it and let the
+            # caller parse the YAML and write a fresh one
+            try:
+                os.remove(pickle_path)
+            except OSError:
+                pass
+            return None
+        return config if pickled_mtime == mtime else None
+
+    def _save_pickled_config(self, config_path: str, mtime: int, config: Dict[str, Any]) -> None:
+        """Store a pickled copy of a parsed config next to its YAML file."""
+        try:
+            with open(config_path + '.pkl', 'wb') as f:
+                pickle.dump((mtime, config), f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            # The pickle is only a startup shortcut; the YAML stays authoritative
+            pass
+
+    def load_config_for_update(self, db_type: str) -> Optional[Dict[str, Any]]:
+        """Load a private copy of the configuration that is safe to mutate.
+
+        load_config hands out the cached dict itself, so edits must not touch it
+        until they have been written to disk.
+        """
+        return copy.deepcopy(self.load_config(db_type))
 
     def save_config(self, db_type: str, config: Dict[str, Any]) -> None:
         """Save schema configuration to file."""
         config_path = self.get_config_path(db_type)
         with open(config_path, 'w') as f:
-            yaml.dump(config, f, sort_keys=False, default_flow_style=False)
+            yaml.dump(config, f, Dumper=SafeDumper, sort_keys=False, default_flow_style=False)
+        self._config_cache.pop(db_type, None)
+
+    @contextmanager
+    def batch_update(self, db_type: str) -> Iterator[Optional[Dict[str, Any]]]:
+        """Group several updates so the config is loaded once and saved once on exit.
+
+        Only updates made on the calling thread join the batch. A nested block for the
+        same db_type joins the outer one, which does the saving. Nothing is written if
+        the block raises.
+        """
+        batch_configs = self._batch_configs()
+        if db_type in batch_configs:
+            # Nested block: share the outer batch's copy and leave saving to it
+            yield batch_configs[db_type]
+            return
+        
+        config = self.load_config_for_update(db_type)
+        batch_configs[db_type] = config
+        try:
+            yield config
+        finally:
+            del batch_configs[db_type]
+        if config:
+            self.save_config(db_type, config)
+
+    def _batch_configs(self) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Return the configs being edited in this thread's open batch_update blocks."""
+        if not hasattr(self._local, 'batch_configs'):
+            self._local.batch_configs = {}
+        return self._local.batch_configs
+
+    def _config_for_update(self, db_type: str) -> Optional[Dict[str, Any]]:
+        """Return the config an update should modify: the batch copy or a fresh one."""
+        batch_configs = self._batch_configs()
+        if db_type in batch_configs:
+            return batch_configs[db_type]
+        return self.load_config_for_update(db_type)
+
+    def _save_update(self, db_type: str, config: Dict[str, Any]) -> None:
+        """Save an updated config unless a batch_update will save it on exit."""
+        if db_type not in self._batch_configs():
+            self.save_config(db_type, config)
 
     def update_field_description(self, db_type: str, table: str, field: str, description: str) -> None:
         """Update description for a specific field in the schema."""
-        config = self.load_config(db_type)
+        config = self._config_for_update(db_type)
         if config and table in config['tables'] and field in config['tables'][table]['fields']:
             config['tables'][table]['fields'][field]['description'] = description
-            self.save_config(db_type, config)
+            self._save_update(db_type, config)
 
     def update_table_description(self, db_type: str, table: str, description: str) -> None:
         """Update description for a specific table in the schema."""
-        config = self.load_config(db_type)
+        config = self._config_for_update(db_type)
         if config and table in config['tables']:
             config['tables'][table]['description'] = description
-            self.save_config(db_type, config)
+            self._save_update(db_type, config)
 
     def update_business_context(self, db_type: str, description: str, key_concepts: list) -> None:
         """Update business context in the schema configuration."""
-        config = self.load_config(db_type)
+        config = self._config_for_update(db_type)
         if config:
             if 'business_context' not in config:
                 config['business_context'] = {}
             config['business_context']['description'] = description
             config['business_context']['key_concepts'] = key_concepts
-            self.save_config(db_type, config)
+            self._save_update(db_type, config)
 
     def get_tables(self, db_type: str) -> list:
         """Get list of tables from schema configuration."""